@@ -1,24 +1,44 @@
 import functools
 import hashlib
+import io
 import json
+import operator
 import pickle
 import secrets
+import sys
 import uuid
+import weakref
 import dash
 import dash_html_components as html
 import dash.dependencies as dd
-import plotly
 
 from dash.dependencies import Input, State, Output, MATCH, ALL, ALLSMALLER, _Wildcard
 from dash.exceptions import PreventUpdate
 from flask import session
-from flask_caching.backends import FileSystemCache
-from more_itertools import unique_everseen, flatten
+from more_itertools import flatten
 from json.decoder import JSONDecodeError
 
 _wildcard_mappings = {ALL: "<ALL>", MATCH: "<MATCH>", ALLSMALLER: "<ALLSMALLER>"}
 _wildcard_values = list(_wildcard_mappings.values())
 
+# Use orjson for json encoding/decoding if available (much faster than the standard library).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Use blake3 for cache ids if available (much faster), otherwise fall back to blake2b from the standard library.
+try:
+    from blake3 import blake3 as _blake3
+
+    def _hash_bytes(payload):
+        return _blake3(payload).hexdigest(length=16)
+
+except ImportError:
+
+    def _hash_bytes(payload):
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
 
 # region Dash proxy
 
@@ -72,12 +92,10 @@ class DashProxy(dash.Dash):
 
     def _register_callbacks(self, app=None):
         callbacks = list(self._resolve_callbacks())
+        target = super() if app is None else app
         for callback in callbacks:
             outputs = callback[dd.Output][0] if len(callback[dd.Output]) == 1 else callback[dd.Output]
-            if app is None:
-                super().callback(outputs, callback[dd.Input], callback[dd.State], **callback["kwargs"])(callback["f"])
-            else:
-                app.callback(outputs, callback[dd.Input], callback[dd.State], **callback["kwargs"])(callback["f"])
+            target.callback(outputs, callback[dd.Input], callback[dd.State], **callback["kwargs"])(callback["f"])
 
     def _layout_value(self):
         layout = self._layout() if self._layout_is_function else self._layout
@@ -122,11 +140,22 @@ def _as_list(item):
 
 
 def _create_callback_id(item):
+    # The id is requested repeatedly (prop matching, cache ids, etc.), so cache it on the dependency object.
+    cached = getattr(item, "_cid_cache", None)
+    if cached is not None:
+        return cached
     cid = item.component_id
     if isinstance(cid, dict):
         cid = {key: cid[key] if cid[key] not in _wildcard_mappings else _wildcard_mappings[cid[key]] for key in cid}
-        cid = json.dumps(cid)
-    return "{}.{}".format(cid, item.component_property)
+        # Sort the keys to make the id canonical across callers.
+        if orjson is not None:
+            cid = orjson.dumps(cid, option=orjson.OPT_SORT_KEYS).decode()
+        else:
+            cid = json.dumps(cid, sort_keys=True, separators=(",", ":"))
+    # Intern the id; the ids are used heavily as dict/set keys, where interned strings compare by pointer.
+    cid = sys.intern("{}.{}".format(cid, item.component_property))
+    item._cid_cache = cid
+    return cid
 
 
 def _extract_list_from_kwargs(kwargs: dict, key: str) -> list:
@@ -143,7 +172,10 @@ def _extract_list_from_kwargs(kwargs: dict, key: str) -> list:
 
 
 def plotly_jsonify(data):
-    return json.loads(json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder))
+    import plotly.utils  # lazy import, plotly is heavy to load
+    # The dumps side must go through the PlotlyJSONEncoder, but the (allocation-heavy) loads side doesn't.
+    payload = json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder)
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
 
 
 class DashTransform:
@@ -167,32 +199,45 @@ class PrefixIdTransform(DashTransform):
     def __init__(self, prefix):
         self.prefix = prefix
         self.initialized = False
+        self._prefixed_layouts = weakref.WeakSet()
 
     def apply(self, callbacks):
+        # Dict ids are modified in-place and may be shared across args; prefix each of them exactly once.
+        seen = set()
         for callback in callbacks:
             for arg in callback["sorted_args"]:
-                arg.component_id = apply_prefix(self.prefix, arg.component_id)
+                component_id = arg.component_id
+                if isinstance(component_id, dict):
+                    if id(component_id) not in seen:
+                        seen.add(id(component_id))
+                        apply_prefix(self.prefix, component_id)
+                else:
+                    arg.component_id = apply_prefix(self.prefix, component_id)
+                # The component id changed, so any cached callback id is stale.
+                if hasattr(arg, "_cid_cache"):
+                    del arg._cid_cache
         return callbacks
 
     def layout(self, layout, layout_is_function):
         # TODO: Will this work with layout functions?
         if layout_is_function or not self.initialized:
-            prefix_id_recursively(layout, self.prefix)
+            # Don't traverse (and re-prefix) layout trees that have already been processed, e.g. when a
+            # layout function returns the same object on every call.
+            if layout not in self._prefixed_layouts:
+                prefix_id_recursively(layout, self.prefix)
+                self._prefixed_layouts.add(layout)
             self.initialized = True
         return layout
 
 
 def apply_prefix(prefix, component_id):
     if isinstance(component_id, dict):
-        for key in component_id:
-            # This branch handles the IDs. TODO: Can we always assume use of ints?
-            if type(component_id[key]) == int:
-                continue
-            # This branch handles the wildcard callbacks.
-            if isinstance(component_id[key], _Wildcard):
+        for key, value in component_id.items():
+            # Skip the IDs (TODO: Can we always assume use of ints?) and the wildcard callbacks.
+            if type(value) == int or isinstance(value, _Wildcard):
                 continue
             # All "normal" props are prefixed.
-            component_id[key] = "{}-{}".format(prefix, component_id[key])
+            component_id[key] = "{}-{}".format(prefix, value)
         return component_id
     return "{}-{}".format(prefix, component_id)
 
@@ -234,11 +279,20 @@ class TriggerTransform(DashTransform):
 
 
 def filter_args(args_filter):
+    keep = tuple(j for j, filtered in enumerate(args_filter) if not filtered)
+    # An itemgetter extracts the kept args in a single C-level call. It returns a bare value (rather than a
+    # tuple) when constructed with a single index, so that case is handled separately.
+    if len(keep) == 1:
+        getter = lambda args: (args[keep[0]],)
+    elif keep:
+        getter = operator.itemgetter(*keep)
+    else:
+        getter = lambda args: ()
+
     def wrapper(f):
         @functools.wraps(f)
         def decorated_function(*args):
-            filtered_args = [arg for j, arg in enumerate(args) if not args_filter[j]]
-            return f(*filtered_args)
+            return f(*getter(args))
 
         return decorated_function
 
@@ -286,10 +340,25 @@ def _combine_callbacks(callbacks):
     kwargs = callbacks[0]["kwargs"]
     multi_output = any([callback["multi_output"] for callback in callbacks])
     if not multi_output:
-        all_outputs = []
-        for callback in callbacks:
-            all_outputs += callback[dd.Output]
-        multi_output = len(list(set(all_outputs))) > 1
+        multi_output = len(set(flatten(callback[dd.Output] for callback in callbacks))) > 1
+    # Index the input props so that trigger matching is a dict lookup rather than a scan over all entries.
+    exact_index = {}
+    wildcard_index = {}
+    for i, entry in enumerate(input_prop_lists):
+        for item in entry:
+            if any([wildcard_value in item for wildcard_value in _wildcard_values]):
+                # Parse the wildcard props once here instead of on every invocation, and precompute which
+                # keys hold wildcards so the matching loop below doesn't have to check values against
+                # _wildcard_values repeatedly. The patterns are bucketed by their key set, so a trigger
+                # only examines patterns of the same shape.
+                try:
+                    item_props = json.loads(item.split(".")[0])
+                except JSONDecodeError:
+                    continue
+                wildcard_keys = frozenset(key for key in item_props if item_props[key] in _wildcard_values)
+                wildcard_index.setdefault(frozenset(item_props), []).append((item_props, wildcard_keys, i))
+            else:
+                exact_index.setdefault(item, []).append(i)
 
     # TODO: There might be a scope issue here
     def wrapper(*args):
@@ -299,31 +368,26 @@ def _combine_callbacks(callbacks):
             raise PreventUpdate
         prop_id = dash.callback_context.triggered[0]['prop_id']
         output_values = [dash.no_update] * len(outputs)
-        for i, entry in enumerate(input_prop_lists):
-            # Check if the trigger is an input of the callback.
-            match = False
-            for item in entry:
-                # Check for exact matches.
-                match = item == prop_id
-                if match:
-                    break
-                # Check for wild card matches.
-                if any([wildcard_value in item for wildcard_value in _wildcard_values]):
-                    try:
-                        props = json.loads(prop_id.split(".")[0])
-                        item_props = json.loads(item.split(".")[0])
-                        prop_match = True
-                        for key in props:
-                            if item_props[key] not in _wildcard_values:
-                                prop_match = prop_match and item_props[key] == props[key]
-                            # TODO: Make checks here, no checks (as now) is only valid for ALL
-                        if prop_match:
-                            match = True
-                            break
-                    except JSONDecodeError:
+        updated = False
+        # Check which callbacks have the trigger as an input.
+        matches = set(exact_index.get(prop_id, ()))
+        if wildcard_index:
+            try:
+                props = json.loads(prop_id.split(".")[0])
+            except JSONDecodeError:
+                props = None
+            if props is not None:
+                for item_props, wildcard_keys, i in wildcard_index.get(frozenset(props), ()):
+                    if i in matches:
                         continue
-            if not match:
-                continue
+                    prop_match = True
+                    for key in props:
+                        if key not in wildcard_keys:
+                            prop_match = prop_match and item_props[key] == props[key]
+                        # TODO: Make checks here, no checks (as now) is only valid for ALL
+                    if prop_match:
+                        matches.add(i)
+        for i in sorted(matches):
             # Trigger the callback function.
             try:
                 inputs_i = [local_inputs[j] for j in input_mappings[i]]
@@ -333,10 +397,11 @@ def _combine_callbacks(callbacks):
                     outputs_i = [outputs_i]
                 for j, item in enumerate(outputs_i):
                     output_values[output_mappings[i][j]] = outputs_i[j]
+                updated = True
             except PreventUpdate:
                 continue
         # Check if an update is needed.
-        if all([item == dash.no_update for item in output_values]):
+        if not updated:
             raise PreventUpdate
         # Return the combined output.
         return output_values if multi_output else output_values[0]  # TODO: Check for multi output here?
@@ -346,13 +411,18 @@ def _combine_callbacks(callbacks):
 
 
 def _prep_props(callbacks, key):
+    # Dedup the props via a dict, which doubles as an O(1) index map for the mappings below.
     all = []
+    index = {}
     for callback in callbacks:
-        all.extend(callback[key])
-    all = list(unique_everseen(all))
-    props = [_create_callback_id(item) for item in all]
+        for item in callback[key]:
+            prop = _create_callback_id(item)
+            if prop not in index:
+                index[prop] = len(all)
+                all.append(item)
+    props = list(index)
     prop_lists = [[_create_callback_id(item) for item in callback[key]] for callback in callbacks]
-    mappings = [[props.index(item) for item in l] for l in prop_lists]
+    mappings = [[index[prop] for prop in l] for l in prop_lists]
     return all, props, prop_lists, mappings
 
 
@@ -461,44 +531,45 @@ def _unpack_outputs(serverside_outputs):
 
 def _pack_outputs(callback):
     memoize = callback["kwargs"].get("memoize", None)
+    # The trigger filter and the output types don't change after registration, so compute them once here.
+    is_trigger = trigger_filter(callback["sorted_args"])
+    keep_idx = tuple(i for i, trigger in enumerate(is_trigger) if not trigger)
+    serverside_flags = [isinstance(output, ServersideOutput) for output in callback[Output]]
 
     def packed_callback(f):
         @functools.wraps(f)
         def decorated_function(*args):
             multi_output = callback["multi_output"]
+            outputs = callback[Output]
+            # Filter out Triggers (a little ugly to do here, should ideally be handled elsewhere).
+            filtered_args = tuple(args[i] for i in keep_idx)
             # If memoize is enabled, we check if the cache already has a valid value.
             if memoize:
                 # Figure out if an update is necessary.
                 unique_ids = []
                 update_needed = False
-                for i, output in enumerate(callback[Output]):
-                    # Filter out Triggers (a little ugly to do here, should ideally be handled elsewhere).
-                    is_trigger = trigger_filter(callback["sorted_args"])
-                    filtered_args = [arg for i, arg in enumerate(args) if not is_trigger[i]]
+                for output in outputs:
                     # Generate unique ID.
-                    unique_id = _get_cache_id(f, output, list(filtered_args), output.cache_args)
+                    unique_id = _get_cache_id(f, output, filtered_args, output.cache_args)
                     unique_ids.append(unique_id)
                     if not output.backend.has(unique_id):
                         update_needed = True
                         break
                 # If not update is needed, just return the ids (or values, if not serverside output).
                 if not update_needed:
-                    results = [uid if isinstance(callback[Output][i], ServersideOutput) else
-                               callback[Output][i].backend.get(uid) for i, uid in enumerate(unique_ids)]
+                    results = [uid if serverside_flags[i] else outputs[i].backend.get(uid)
+                               for i, uid in enumerate(unique_ids)]
                     return results if multi_output else results[0]
             # Do the update.
             data = f(*args)
             data = list(data) if multi_output else [data]
             if callable(memoize):
                 data = memoize(data)
-            for i, output in enumerate(callback[Output]):
-                serverside_output = isinstance(callback[Output][i], ServersideOutput)
+            for i, output in enumerate(outputs):
+                serverside_output = serverside_flags[i]
                 # Replace only for server side outputs.
                 if serverside_output or memoize:
-                    # Filter out Triggers (a little ugly to do here, should ideally be handled elsewhere).
-                    is_trigger = trigger_filter(callback["sorted_args"])
-                    filtered_args = [arg for i, arg in enumerate(args) if not is_trigger[i]]
-                    unique_id = _get_cache_id(f, output, list(filtered_args), output.cache_args)
+                    unique_id = _get_cache_id(f, output, filtered_args, output.cache_args)
                     output.backend.set(unique_id, data[i])
                     # Replace only for server side outputs.
                     if serverside_output:
@@ -521,9 +592,8 @@ def _get_cache_id(func, output, args, cache_args=DEFAULT_CACHE_ARGS):
     if 'session' in cache_args:
         all_args.append(_get_session_id())
 
-    cache_id = hashlib.md5(json.dumps(all_args).encode()).hexdigest()
-
-    return cache_id
+    # Pickling is much faster than json encoding and supports a wider range of argument types.
+    return _hash_bytes(pickle.dumps(all_args, protocol=pickle.HIGHEST_PROTOCOL))
 
 
 # Interface definition for server stores.
@@ -542,22 +612,115 @@ class ServerStore:
 
 # Place store implementations here.
 
-class FileSystemStore(FileSystemCache):
+class FileSystemStore(ServerStore):
 
     def __init__(self, cache_dir="file_system_store", **kwargs):
-        super().__init__(cache_dir, **kwargs)
+        # Lazy import so that apps not using serverside outputs don't pay for loading flask_caching.
+        from flask_caching.backends import FileSystemCache
+        self._cache = FileSystemCache(cache_dir, **kwargs)
 
     def get(self, key, ignore_expired=False):
         if not ignore_expired:
-            return super().get(key)
+            return self._cache.get(key)
         # TODO: This part must be implemented for each type of cache.
-        filename = self._get_filename(key)
+        filename = self._cache._get_filename(key)
         try:
+            # Read the whole file in one go, which releases the GIL around the read so other threads
+            # (e.g. concurrent requests) aren't blocked on disk I/O.
             with open(filename, "rb") as f:
-                pickle_time = pickle.load(f)  # ignore time
-                return pickle.load(f)
-        except (IOError, OSError, pickle.PickleError):
+                payload = f.read()
+            unpickler = pickle.Unpickler(io.BytesIO(payload))
+            unpickler.load()  # ignore time
+            return unpickler.load()
+        except (IOError, OSError, EOFError, pickle.PickleError):
+            return None
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def has(self, key):
+        return self._cache.has(key)
+
+    def __getattr__(self, name):
+        # Fall through to the underlying cache for anything not part of the store interface.
+        if name == "_cache":
+            raise AttributeError(name)
+        return getattr(self._cache, name)
+
+
+class RedisStore(ServerStore):
+    """
+     Store implementation based on Redis. Unlike the file system store, it can be shared across workers.
+    """
+
+    def __init__(self, default_timeout=None, **kwargs):
+        import redis  # lazy import, the redis package is an optional dependency
+        self.default_timeout = default_timeout
+        self.r = redis.Redis(**kwargs)
+
+    def get(self, key, ignore_expired=False):
+        # The key is None when the producing callback hasn't run yet; treat it as a miss (redis itself
+        # would raise a DataError).
+        if key is None:
             return None
+        value = self.r.get(key)
+        return _deserialize_payload(value) if value is not None else None
+
+    def set(self, key, value):
+        self.r.set(key, _serialize_payload(value), ex=self.default_timeout)
+
+    def has(self, key):
+        return bool(self.r.exists(key))
+
+
+# Use pyarrow for dataframe payloads if available; the Arrow IPC format avoids the intermediate copies
+# that pickling a dataframe entails. Like redis, pandas/pyarrow are optional dependencies and are
+# imported lazily (on first payload) to keep module import fast.
+pandas, pyarrow = None, None
+_arrow_import_attempted = False
+
+
+def _load_arrow():
+    global pandas, pyarrow, _arrow_import_attempted
+    if not _arrow_import_attempted:
+        _arrow_import_attempted = True
+        try:
+            import pandas as _pandas
+            import pyarrow as _pyarrow
+            import pyarrow.ipc
+            pandas, pyarrow = _pandas, _pyarrow
+        except ImportError:
+            pass
+    return pyarrow
+
+
+# Payloads are tagged with a single marker byte indicating the serialization format.
+_PICKLE_MARKER = b"\x00"
+_ARROW_MARKER = b"\x01"
+
+
+def _serialize_payload(value):
+    if _load_arrow() is not None and isinstance(value, pandas.DataFrame):
+        try:
+            table = pyarrow.Table.from_pandas(value)
+            sink = pyarrow.BufferOutputStream()
+            with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return _ARROW_MARKER + sink.getvalue().to_pybytes()
+        except pyarrow.ArrowException:
+            # Not all dataframes can be represented in Arrow (mixed-type object columns, complex dtypes,
+            # etc.); fall through and pickle those like any other value.
+            pass
+    return _PICKLE_MARKER + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialize_payload(payload):
+    if payload[:1] == _ARROW_MARKER:
+        if _load_arrow() is None:
+            raise RuntimeError("Cannot read an Arrow-serialized payload, the pyarrow package is not installed.")
+        with pyarrow.ipc.open_stream(pyarrow.py_buffer(memoryview(payload)[1:])) as reader:
+            return reader.read_pandas()
+    return pickle.loads(memoryview(payload)[1:])
 
 
 # endregion
@@ -569,11 +732,15 @@ class NoOutputTransform(DashTransform):
     def __init__(self):
         self.initialized = False
         self.hidden_divs = []
+        self._patched_layouts = weakref.WeakSet()
 
     def layout(self, layout, layout_is_function):
         if layout_is_function or not self.initialized:
-            children = _as_list(layout.children) + self.hidden_divs
-            layout.children = children
+            # Append the hidden divs only once per layout object to avoid duplicates (and the list
+            # concatenation) on repeated calls.
+            if layout not in self._patched_layouts:
+                layout.children = _as_list(layout.children) + self.hidden_divs
+                self._patched_layouts.add(layout)
             self.initialized = True
         return layout
 